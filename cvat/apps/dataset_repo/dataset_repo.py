@@ -26,9 +26,9 @@ from cvat.apps.dataset_repo.models import GitData, GitStatusChoice
 
 def _have_no_access_exception(ex):
     if 'Permission denied' in ex.stderr or 'Could not read from remote repository' in ex.stderr:
-        keys = subprocess.run(['ssh-add -L'], shell = True,
-            stdout = subprocess.PIPE).stdout.decode('utf-8').split('\n')
-        keys = list(filter(len, list(map(lambda x: x.strip(), keys))))
+        keys = subprocess.run(['ssh-add', '-L'],
+            stdout = subprocess.PIPE, text = True).stdout.splitlines()
+        keys = list(filter(len, map(str.strip, keys)))
         raise Exception(
             'Could not connect to the remote repository. ' +
             'Please make sure you have the correct access rights and the repository exists. ' +
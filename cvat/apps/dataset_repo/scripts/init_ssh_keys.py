@@ -0,0 +1,119 @@
+# Copyright (C) 2020-2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import fcntl
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# The script is run by the container entrypoint directly, without Django,
+# so it must not import settings. BASE_DIR is the repository root.
+BASE_DIR = str(Path(__file__).parents[4])
+
+SSH_AGENTC_REQUEST_IDENTITIES = 11
+SSH_AGENT_IDENTITIES_ANSWER = 12
+LOCK_TIMEOUT = 120 # seconds
+KEY_FILES = ('id_rsa', 'id_rsa.pub')
+
+def count_agent_identities():
+    # Query ssh-agent over SSH_AUTH_SOCK directly instead of spawning 'ssh-add -l'.
+    # Returns None if the agent is not reachable.
+    sock_path = os.getenv('SSH_AUTH_SOCK')
+    if not sock_path:
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(30)
+            sock.connect(sock_path)
+            sock.sendall(struct.pack('>IB', 1, SSH_AGENTC_REQUEST_IDENTITIES))
+            with sock.makefile('rb') as reply:
+                header = reply.read(9)
+    except OSError:
+        return None
+
+    if len(header) < 9:
+        return None
+    _, msg_type, nkeys = struct.unpack('>IBI', header)
+    if msg_type != SSH_AGENT_IDENTITIES_ANSWER:
+        return None
+    return nkeys
+
+def _sync_keys(src_dir, dst_dir, names=KEY_FILES):
+    for name in names:
+        shutil.copy2(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+
+def init_ssh_keys(keys_dir, log=print):
+    ssh_dir = os.path.join(os.getenv('HOME'), '.ssh')
+    pidfile = os.path.join(ssh_dir, 'ssh.pid')
+    private_key_ssh = os.path.join(ssh_dir, 'id_rsa')
+
+    def add_ssh_keys():
+        # Returns True if all keys from ssh_dir were added to the agent
+        IGNORE_FILES = ('README.md', 'ssh.pid')
+        keys_to_add = [entry.path for entry in os.scandir(ssh_dir) if entry.name not in IGNORE_FILES]
+        if not keys_to_add:
+            return False
+        return subprocess.run(['ssh-add', *keys_to_add],
+            stderr = subprocess.PIPE,
+            # lets set the timeout if ssh-add requires a input passphrase for key
+            # otherwise the process will be freezed
+            timeout=30,
+            ).returncode == 0
+
+    # Fast path: keys are already in place, no need to take the lock
+    # Ask the agent only if ssh-add failed for some files (e.g. ssh config)
+    if add_ssh_keys() or count_agent_identities() != 0:
+        return
+
+    # don't truncate the pidfile, it can be locked by another process
+    with open(pidfile, "a") as pid:
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                fcntl.flock(pid, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    raise Exception('Could not acquire the lock on {}'.format(pidfile))
+                time.sleep(0.1)
+        try:
+            # keys could have been created while we were waiting for the lock
+            if not add_ssh_keys() and count_agent_identities() == 0:
+                log('SSH keys were not found')
+
+                has_private_key = has_public_key = False
+                with os.scandir(keys_dir) as volume_keys:
+                    for entry in volume_keys:
+                        if entry.name == 'id_rsa':
+                            has_private_key = True
+                        elif entry.name == 'id_rsa.pub':
+                            has_public_key = True
+                        if has_private_key and has_public_key:
+                            break
+
+                if not (has_private_key and has_public_key):
+                    log('New pair of keys are being generated')
+                    subprocess.run(['ssh-keygen', '-t', 'ed25519', '-f', private_key_ssh, '-q', '-N', ''],
+                        check=True)
+                    _sync_keys(ssh_dir, keys_dir)
+                else:
+                    log('Copying them from keys volume')
+                    _sync_keys(keys_dir, ssh_dir)
+                add_ssh_keys()
+        finally:
+            fcntl.flock(pid, fcntl.LOCK_UN)
+
+if __name__ == '__main__':
+    try:
+        init_ssh_keys(os.path.join(BASE_DIR, 'keys'),
+            log=lambda msg: print(msg, flush=True))
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
@@ -7,8 +7,12 @@ import tempfile
 import shutil
 import zipfile
 import io
-import itertools
+import struct
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 
 import av
 import numpy as np
@@ -16,12 +20,46 @@ from pyunpack import Archive
 from PIL import Image, ImageFile
 from cvat.apps.engine.utils import rotate_image
 
+try:
+    # libjpeg-turbo bindings, much faster than Pillow for JPEG decoding and encoding
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
 # fixes: "OSError:broken data stream" when executing line 72 while loading images downloaded from the web
 # see: https://stackoverflow.com/questions/42462431/oserror-broken-data-stream-when-reading-image-file
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 from cvat.apps.engine.mime_types import mimetypes
 
+# JPEG encoding and decoding release the GIL, so images of a chunk
+# can be compressed in parallel. The pool is shared by all chunk writers
+# of the process, so concurrent chunk requests don't multiply the threads.
+CHUNK_WRITER_THREADS = int(os.getenv('CVAT_CHUNK_WRITER_THREADS', 0)) or \
+    min(4, os.cpu_count() or 1)
+
+_chunk_writer_executor = None
+_chunk_writer_executor_lock = threading.Lock()
+
+def _get_chunk_writer_executor():
+    global _chunk_writer_executor
+    with _chunk_writer_executor_lock:
+        if _chunk_writer_executor is None:
+            _chunk_writer_executor = ThreadPoolExecutor(
+                max_workers=CHUNK_WRITER_THREADS, thread_name_prefix='chunk_writer')
+        return _chunk_writer_executor
+
+def _reset_chunk_writer_executor():
+    # the threads of the pool don't exist in a forked process
+    global _chunk_writer_executor, _chunk_writer_executor_lock
+    _chunk_writer_executor = None
+    _chunk_writer_executor_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_chunk_writer_executor)
+
+# Chroma subsampling of compressed JPEG images: "4:2:0" (default), "4:2:2" or "4:4:4"
+JPEG_CHROMA_SUBSAMPLING = os.getenv('CVAT_JPEG_CHROMA_SUBSAMPLING', '4:2:0')
+
 def get_mime(name):
     for type_name, type_def in MEDIA_TYPES.items():
         if type_def['has_mime_type'](name):
@@ -29,6 +67,43 @@ def get_mime(name):
 
     return 'unknown'
 
+# JPEG start of frame markers, they contain the image size
+_JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+# JPEG markers without a length field
+_JPEG_STANDALONE_MARKERS = frozenset((0x01, *range(0xD0, 0xD9)))
+
+def _read_image_size(fp):
+    # Reads width and height from JPEG SOF or PNG IHDR headers without
+    # decoding the image. Returns None for other formats or broken headers.
+    header = fp.read(24)
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+    if header[:2] != b'\xff\xd8':
+        return None
+
+    fp.seek(2)
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        while code == 0xFF: # fill bytes
+            code = fp.read(1)
+            if not code:
+                return None
+            code = code[0]
+        if code in _JPEG_STANDALONE_MARKERS:
+            continue
+
+        segment_header = fp.read(7)
+        if len(segment_header) < 7:
+            return None
+        length, _, height, width = struct.unpack('>HBHH', segment_header)
+        if code in _JPEG_SOF_MARKERS:
+            return (width, height) if width and height else None
+        fp.seek(length - 7, io.SEEK_CUR)
+
 def create_tmp_dir():
     return tempfile.mkdtemp(prefix='cvat-', suffix='.data')
 
@@ -117,14 +192,24 @@ class ImageListReader(IMediaReader):
         img = Image.open(self._source_path[i])
         return img.width, img.height
 
+def _walk_files(root):
+    # The same files as os.walk() gives, but DirEntry types from os.scandir()
+    # are used directly without building per directory lists
+    try:
+        entries = list(os.scandir(root))
+    except OSError: # os.walk() skips unreadable directories as well
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_files(entry.path)
+        elif not entry.is_dir(): # symlinks to directories are not followed
+            yield entry.path
+
 class DirectoryReader(ImageListReader):
     def __init__(self, source_path, step=1, start=0, stop=None):
         image_paths = []
         for source in source_path:
-            for root, _, files in os.walk(source):
-                paths = [os.path.join(root, f) for f in files]
-                paths = filter(lambda x: get_mime(x) == 'image', paths)
-                image_paths.extend(paths)
+            image_paths.extend(p for p in _walk_files(source) if get_mime(p) == 'image')
         super().__init__(
             source_path=image_paths,
             step=step,
@@ -147,6 +232,8 @@ class ArchiveReader(DirectoryReader):
         )
 
 class PdfReader(ImageListReader):
+    DPI = 200
+
     def __init__(self, source_path, step=1, start=0, stop=None):
         if not source_path:
             raise Exception('No PDF found')
@@ -154,19 +241,49 @@ class PdfReader(ImageListReader):
         self._pdf_source = source_path[0]
 
         _basename = os.path.splitext(os.path.basename(self._pdf_source))[0]
-        _counter = itertools.count()
-        def _make_name():
-            for page_num in _counter:
-                yield '{}{:09d}.jpeg'.format(_basename, page_num)
 
-        from pdf2image import convert_from_path
+        import pypdfium2 as pdfium
         self._tmp_dir = os.path.dirname(source_path[0])
         os.makedirs(self._tmp_dir, exist_ok=True)
 
-        # Avoid OOM: https://github.com/openvinotoolkit/cvat/issues/940
-        paths = convert_from_path(self._pdf_source,
-            last_page=stop, paths_only=True,
-            output_folder=self._tmp_dir, fmt="jpeg", output_file=_make_name())
+        # Pages are rendered in-process and saved to the disk right away,
+        # only a few of them are kept in memory to avoid OOM:
+        # https://github.com/openvinotoolkit/cvat/issues/940
+        # pdfium isn't thread-safe, so all its calls are done in this thread
+        # and only the JPEG encoding of rendered pages runs in parallel.
+        def save_page(image, path):
+            image.save(path, format='JPEG')
+            image.close()
+
+        max_pages_in_flight = os.cpu_count() or 1
+        paths = []
+        pdf = pdfium.PdfDocument(self._pdf_source)
+        try:
+            with ThreadPoolExecutor(max_workers=max_pages_in_flight) as executor:
+                in_flight = deque()
+                def finish_page():
+                    # the PIL image may share the bitmap buffer,
+                    # so the bitmap is released after the image is saved
+                    saving, bitmap, page = in_flight.popleft()
+                    saving.result()
+                    bitmap.close()
+                    page.close()
+
+                page_count = len(pdf) if stop is None else min(len(pdf), stop)
+                for page_num in range(page_count):
+                    if len(in_flight) == max_pages_in_flight:
+                        finish_page()
+                    page = pdf[page_num]
+                    bitmap = page.render(scale=self.DPI / 72)
+                    path = os.path.join(self._tmp_dir,
+                        '{}{:09d}.jpeg'.format(_basename, page_num))
+                    in_flight.append((executor.submit(save_page, bitmap.to_pil(), path),
+                        bitmap, page))
+                    paths.append(path)
+                while in_flight:
+                    finish_page()
+        finally:
+            pdf.close()
 
         os.remove(source_path[0])
 
@@ -188,14 +305,23 @@ class ZipReader(ImageListReader):
         self._zip_source.close()
 
     def get_preview(self):
-        io_image = io.BytesIO(self._zip_source.read(self._source_path[0]))
-        return self._get_preview(io_image)
+        with self._zip_source.open(self._source_path[0]) as image:
+            return self._get_preview(image)
 
     def get_image_size(self, i):
-        img = Image.open(io.BytesIO(self._zip_source.read(self._source_path[i])))
-        return img.width, img.height
+        # Only the image header is read, so the member
+        # is not decompressed completely
+        with self._zip_source.open(self._source_path[i]) as image:
+            size = _read_image_size(image)
+            if size is None:
+                image.seek(0)
+                img = Image.open(image)
+                size = img.width, img.height
+            return size
 
     def get_image(self, i):
+        # Callers can read the image several times and use getvalue(), so
+        # return BytesIO. It shares the buffer with the bytes, no extra copy.
         return io.BytesIO(self._zip_source.read(self._source_path[i]))
 
     def get_path(self, i):
@@ -227,14 +353,41 @@ class VideoReader(IMediaReader):
 
         return False
 
+    @staticmethod
+    def _get_rotation_graph(stream):
+        # Right angle rotations are done by libavfilter on the decoded planes
+        # instead of converting every frame to a numpy array and back
+        rotation_filters = {
+            90: (('transpose', 'clock'), ),
+            180: (('hflip', None), ('vflip', None)),
+            270: (('transpose', 'cclock'), ),
+        }.get(int(stream.metadata.get('rotate', 0)) % 360)
+        if not rotation_filters:
+            return None
+
+        graph = av.filter.Graph()
+        last_filter = graph.add_buffer(template=stream)
+        for name, args in rotation_filters:
+            rotation_filter = graph.add(name, args)
+            last_filter.link_to(rotation_filter)
+            last_filter = rotation_filter
+        last_filter.link_to(graph.add('buffersink'))
+        graph.configure()
+
+        return graph
+
     def _decode(self, container):
         frame_num = 0
+        rotation_graph = self._get_rotation_graph(container.streams.video[0])
         for packet in container.demux():
             if packet.stream.type == 'video':
                 for image in packet.decode():
                     frame_num += 1
                     if self._has_frame(frame_num - 1):
-                        if packet.stream.metadata.get('rotate'):
+                        if rotation_graph:
+                            rotation_graph.push(image)
+                            image = rotation_graph.pull()
+                        elif packet.stream.metadata.get('rotate'):
                             old_image = image
                             image = av.VideoFrame().from_ndarray(
                                 rotate_image(
@@ -253,11 +406,14 @@ class VideoReader(IMediaReader):
 
         return self._decode(container)
 
+    @cached_property
+    def _duration(self):
+        with self._get_av_container() as container:
+            # Not for all containers return real value
+            return container.streams.video[0].duration
+
     def get_progress(self, pos):
-        container = self._get_av_container()
-        # Not for all containers return real value
-        stream = container.streams.video[0]
-        return pos / stream.duration if stream.duration else None
+        return pos / self._duration if self._duration else None
 
     def _get_av_container(self):
         if isinstance(self._source_path[0], io.BytesIO):
@@ -278,28 +434,132 @@ class VideoReader(IMediaReader):
             ).to_image()
         )
 
-    def get_image_size(self, i):
+    @cached_property
+    def _frame_size(self):
+        # The frame size is known from the stream parameters, so usually
+        # there is no need to decode a frame
+        with self._get_av_container() as container:
+            stream = container.streams.video[0]
+            width, height = stream.codec_context.width, stream.codec_context.height
+            rotation = int(stream.metadata.get('rotate', 0)) % 360
+        if width and height and rotation in (0, 180):
+            return width, height
+        if width and height and rotation in (90, 270):
+            return height, width
+
         image = (next(iter(self)))[0]
         return image.width, image.height
 
+    def get_image_size(self, i):
+        return self._frame_size
+
+# Sum of the IJG standard luminance quantization table (quality 50),
+# it is used to estimate the quality a JPEG was saved with
+_JPEG_STD_LUMINANCE_QTABLE_SUM = sum((
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+))
+
+def _estimate_jpeg_quality(image):
+    luminance_qtable = image.quantization.get(0) if image.quantization else None
+    if not luminance_qtable:
+        return None
+    scale = sum(luminance_qtable) * 100 / _JPEG_STD_LUMINANCE_QTABLE_SUM
+    return round((200 - scale) / 2 if scale <= 100 else 5000 / scale)
+
 class IChunkWriter(ABC):
     def __init__(self, quality):
         self._image_quality = quality
 
+    @staticmethod
+    def _passthrough_jpeg(image_path, quality):
+        # Returns the source bytes as is if the image is an RGB JPEG already
+        # saved with the target quality or lower, re-encoding it would only lose details.
+        # Returns None otherwise
+        def read_jpeg(fp):
+            if fp.read(2) != b'\xff\xd8':
+                return None
+            fp.seek(0)
+            try:
+                image = Image.open(fp)
+            except IOError:
+                return None
+            estimated_quality = _estimate_jpeg_quality(image)
+            # the EXIF orientation would be lost after re-encoding, so the
+            # result must be the same for the client
+            if image.mode != 'RGB' or estimated_quality is None \
+                    or estimated_quality > quality \
+                    or image.getexif().get(0x0112, 1) != 1:
+                return None
+            fp.seek(0)
+            return (*image.size, io.BytesIO(fp.read()))
+
+        if isinstance(image_path, io.IOBase):
+            result = read_jpeg(image_path)
+            image_path.seek(0)
+            return result
+        with open(image_path, 'rb') as f:
+            return read_jpeg(f)
+
+    @staticmethod
+    def _compress_jpeg(image_path, quality):
+        # Returns None if the image is not a JPEG or can't be processed by libjpeg-turbo
+        def read_jpeg(fp):
+            if fp.read(2) != b'\xff\xd8':
+                return None
+            fp.seek(0)
+            return fp.read()
+
+        if isinstance(image_path, io.IOBase):
+            data = read_jpeg(image_path)
+            image_path.seek(0)
+        else:
+            with open(image_path, 'rb') as f:
+                data = read_jpeg(f)
+        if data is None:
+            return None
+
+        try:
+            image = simplejpeg.decode_jpeg(data, colorspace='RGB')
+        except ValueError:
+            return None
+        height, width = image.shape[:2]
+        buf = io.BytesIO(simplejpeg.encode_jpeg(image, quality=quality,
+            colorspace='RGB', colorsubsampling=JPEG_CHROMA_SUBSAMPLING.replace(':', '')))
+        return width, height, buf
+
     @staticmethod
     def _compress_image(image_path, quality):
+        if not isinstance(image_path, av.VideoFrame):
+            source = IChunkWriter._passthrough_jpeg(image_path, quality)
+            if source is not None:
+                return source
+
+        if simplejpeg is not None and not isinstance(image_path, av.VideoFrame):
+            compressed = IChunkWriter._compress_jpeg(image_path, quality)
+            if compressed is not None:
+                return compressed
+
         image = image_path.to_image() if isinstance(image_path, av.VideoFrame) else Image.open(image_path)
         # Ensure image data fits into 8bit per pixel before RGB conversion as PIL clips values on conversion
         if image.mode == "I":
             # Image mode is 32bit integer pixels.
-            # Autoscale pixels by factor 2**8 / im_data.max() to fit into 8bit
-            im_data = np.array(image)
-            im_data = im_data * (2**8 / im_data.max())
-            image = Image.fromarray(im_data.astype(np.int32))
+            # Autoscale pixels by factor 255 / im_data.max() to fit into 8bit
+            im_data = np.asarray(image)
+            im_data = np.multiply(im_data, 255 / (im_data.max() or 1), dtype=np.float32)
+            np.clip(im_data, 0, 255, out=im_data)
+            image = Image.fromarray(im_data.astype(np.uint8), mode='L')
         converted_image = image.convert('RGB')
         image.close()
         buf = io.BytesIO()
-        converted_image.save(buf, format='JPEG', quality=quality, optimize=True)
+        converted_image.save(buf, format='JPEG', quality=quality,
+            subsampling=JPEG_CHROMA_SUBSAMPLING, optimize=False, progressive=False)
         buf.seek(0)
         width, height = converted_image.size
         converted_image.close()
@@ -325,13 +585,27 @@ class ZipChunkWriter(IChunkWriter):
 class ZipCompressedChunkWriter(IChunkWriter):
     def save_as_chunk(self, images, chunk_path):
         image_sizes = []
+        executor = _get_chunk_writer_executor()
+        # only a few compressed images are kept in memory ahead of the one
+        # written to the archive
+        max_images_in_flight = 2 * CHUNK_WRITER_THREADS
         with zipfile.ZipFile(chunk_path, 'x') as zip_chunk:
-            for idx, (image, _ , _) in enumerate(images):
-                w, h, image_buf = self._compress_image(image, self._image_quality)
+            in_flight = deque()
+            def write_image():
+                # zipfile isn't thread-safe, so the results are written from this thread only
+                w, h, image_buf = in_flight.popleft().result()
+                arcname = '{:06d}.jpeg'.format(len(image_sizes))
                 image_sizes.append((w, h))
-                arcname = '{:06d}.jpeg'.format(idx)
                 zip_chunk.writestr(arcname, image_buf.getvalue())
 
+            for image, _, _ in images:
+                if len(in_flight) == max_images_in_flight:
+                    write_image()
+                in_flight.append(executor.submit(
+                    self._compress_image, image, self._image_quality))
+            while in_flight:
+                write_image()
+
         return image_sizes
 
 class Mpeg4ChunkWriter(IChunkWriter):
@@ -342,10 +616,8 @@ class Mpeg4ChunkWriter(IChunkWriter):
     @staticmethod
     def _create_av_container(path, w, h, rate, options, f='mp4'):
             # x264 requires width and height must be divisible by 2 for yuv420p
-            if h % 2:
-                h += 1
-            if w % 2:
-                w += 1
+            w = (w + 1) & ~1
+            h = (h + 1) & ~1
 
             container = av.open(path, 'w',format=f)
             video_stream = container.add_stream('libopenh264', rate=rate)
@@ -432,8 +704,20 @@ class Mpeg4CompressedChunkWriter(Mpeg4ChunkWriter):
         output_container.close()
         return [(input_w, input_h)]
 
+@lru_cache(maxsize=None)
+def _guess_type_by_ext(ext):
+    return mimetypes.guess_type('file' + ext)
+
+def _guess_type(path):
+    # mimetypes looks only at the file extension (and at the previous one
+    # for compressed files, e.g. .tar.gz), so the results are cached by it
+    root, ext = os.path.splitext(path)
+    if ext.lower() in mimetypes.encodings_map:
+        ext = os.path.splitext(root)[1] + ext
+    return _guess_type_by_ext(ext)
+
 def _is_archive(path):
-    mime = mimetypes.guess_type(path)
+    mime = _guess_type(path)
     mime_type = mime[0]
     encoding = mime[1]
     supportedArchives = ['application/x-rar-compressed',
@@ -442,11 +726,11 @@ def _is_archive(path):
     return mime_type in supportedArchives or encoding in supportedArchives
 
 def _is_video(path):
-    mime = mimetypes.guess_type(path)
+    mime = _guess_type(path)
     return mime[0] is not None and mime[0].startswith('video')
 
 def _is_image(path):
-    mime = mimetypes.guess_type(path)
+    mime = _guess_type(path)
     # Exclude vector graphic images because Pillow cannot work with them
     return mime[0] is not None and mime[0].startswith('image') and \
         not mime[0].startswith('image/svg')
@@ -455,11 +739,11 @@ def _is_dir(path):
     return os.path.isdir(path)
 
 def _is_pdf(path):
-    mime = mimetypes.guess_type(path)
+    mime = _guess_type(path)
     return mime[0] == 'application/pdf'
 
 def _is_zip(path):
-    mime = mimetypes.guess_type(path)
+    mime = _guess_type(path)
     mime_type = mime[0]
     encoding = mime[1]
     supportedArchives = ['application/zip']
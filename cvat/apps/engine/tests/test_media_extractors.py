@@ -0,0 +1,227 @@
+# Copyright (C) 2021 Intel Corporation
+#
+# SPDX-License-Identifier: MIT
+
+import io
+import os.path as osp
+import tempfile
+import zipfile
+from unittest import TestCase
+
+import av
+import numpy as np
+from PIL import Image
+
+from cvat.apps.engine.media_extractors import (CHUNK_WRITER_THREADS,
+    IChunkWriter, Mpeg4CompressedChunkWriter, ZipCompressedChunkWriter,
+    ZipReader, _estimate_jpeg_quality, _guess_type, _read_image_size, get_mime)
+from cvat.apps.engine.mime_types import mimetypes
+
+
+def generate_image(mode='RGB', size=(64, 48)):
+    image = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    image[..., 0] = np.linspace(0, 255, size[0], dtype=np.uint8)
+    image[..., 1] = np.linspace(0, 255, size[1], dtype=np.uint8)[:, None]
+    return Image.fromarray(image).convert(mode)
+
+def save_image(image, **kwargs):
+    buf = io.BytesIO()
+    image.save(buf, **kwargs)
+    buf.seek(0)
+    return buf
+
+
+class Mpeg4CompressedChunkWriterTest(TestCase):
+    def test_can_downscale_full_hd_frames(self):
+        frames = [
+            (av.VideoFrame.from_ndarray(
+                np.full((1080, 1920, 3), 10 * i, dtype=np.uint8), format='rgb24'),
+             'video.mp4', i)
+            for i in range(3)
+        ]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            chunk_path = osp.join(tmp_dir, 'chunk.mp4')
+            image_sizes = Mpeg4CompressedChunkWriter(50).save_as_chunk(
+                frames, chunk_path)
+
+            container = av.open(chunk_path)
+            chunk_frames = list(container.decode(video=0))
+            container.close()
+
+        self.assertEqual(image_sizes, [(1920, 1080)])
+        self.assertEqual(len(chunk_frames), 3)
+        for frame in chunk_frames:
+            self.assertEqual((frame.width, frame.height), (960, 540))
+
+
+class ZipCompressedChunkWriterTest(TestCase):
+    def test_can_save_images_in_order(self):
+        # more images than are compressed at once
+        sizes = [(32 + 2 * i, 24 + i) for i in range(4 * CHUNK_WRITER_THREADS + 1)]
+        images = [(save_image(generate_image(size=size), format='PNG'), 'image.png', i)
+            for i, size in enumerate(sizes)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            chunk_path = osp.join(tmp_dir, 'chunk.zip')
+            image_sizes = ZipCompressedChunkWriter(70).save_as_chunk(
+                iter(images), chunk_path)
+
+            with zipfile.ZipFile(chunk_path) as chunk:
+                names = chunk.namelist()
+                chunk_sizes = [Image.open(io.BytesIO(chunk.read(name))).size
+                    for name in names]
+
+        self.assertEqual(image_sizes, sizes)
+        self.assertEqual(names, ['{:06d}.jpeg'.format(i) for i in range(len(sizes))])
+        self.assertEqual(chunk_sizes, sizes)
+
+
+class JpegCompressionTest(TestCase):
+    def test_can_estimate_jpeg_quality(self):
+        for quality in (30, 50, 75, 90, 95):
+            with self.subTest(quality=quality):
+                image = Image.open(save_image(generate_image(),
+                    format='JPEG', quality=quality))
+
+                self.assertEqual(_estimate_jpeg_quality(image), quality)
+
+    def test_passes_through_jpeg_with_lower_quality(self):
+        source = save_image(generate_image(), format='JPEG', quality=70)
+
+        for target_quality in (70, 90):
+            with self.subTest(target_quality=target_quality):
+                result = IChunkWriter._passthrough_jpeg(source, target_quality)
+
+                self.assertIsNotNone(result)
+                width, height, buf = result
+                self.assertEqual((width, height), (64, 48))
+                self.assertEqual(buf.getvalue(), source.getvalue())
+                self.assertEqual(source.tell(), 0)
+
+    def test_reencodes_jpeg_with_higher_quality(self):
+        source = save_image(generate_image(), format='JPEG', quality=95)
+
+        self.assertIsNone(IChunkWriter._passthrough_jpeg(source, 70))
+
+        width, height, buf = IChunkWriter._compress_image(source, 70)
+        self.assertEqual((width, height), (64, 48))
+        self.assertNotEqual(buf.getvalue(), source.getvalue())
+        self.assertEqual(_estimate_jpeg_quality(Image.open(buf)), 70)
+
+    def test_reencodes_jpeg_with_exif_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6 # rotated 90 degrees clockwise
+        source = save_image(generate_image(), format='JPEG', quality=50,
+            exif=exif.tobytes())
+
+        self.assertIsNone(IChunkWriter._passthrough_jpeg(source, 70))
+
+        _, _, buf = IChunkWriter._compress_image(source, 70)
+        self.assertNotEqual(buf.getvalue(), source.getvalue())
+
+    def test_reencodes_grayscale_jpeg(self):
+        source = save_image(generate_image(mode='L'), format='JPEG', quality=50)
+
+        self.assertIsNone(IChunkWriter._passthrough_jpeg(source, 70))
+
+        width, height, buf = IChunkWriter._compress_image(source, 70)
+        self.assertEqual((width, height), (64, 48))
+        self.assertEqual(Image.open(buf).mode, 'RGB')
+
+    def test_reencodes_png(self):
+        source = save_image(generate_image(), format='PNG')
+
+        self.assertIsNone(IChunkWriter._passthrough_jpeg(source, 70))
+        self.assertIsNone(IChunkWriter._compress_jpeg(source, 70))
+
+        width, height, buf = IChunkWriter._compress_image(source, 70)
+        self.assertEqual((width, height), (64, 48))
+        self.assertEqual(Image.open(buf).format, 'JPEG')
+
+    def test_passes_through_jpeg_file(self):
+        source = save_image(generate_image(), format='JPEG', quality=50)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = osp.join(tmp_dir, 'image.jpg')
+            with open(path, 'wb') as f:
+                f.write(source.getvalue())
+
+            _, _, buf = IChunkWriter._compress_image(path, 70)
+
+        self.assertEqual(buf.getvalue(), source.getvalue())
+
+
+class ImageSizeTest(TestCase):
+    def test_can_read_baseline_jpeg_size(self):
+        source = save_image(generate_image(size=(640, 480)), format='JPEG')
+
+        self.assertEqual(_read_image_size(source), (640, 480))
+
+    def test_can_read_progressive_jpeg_size(self):
+        source = save_image(generate_image(size=(640, 480)), format='JPEG',
+            progressive=True)
+
+        self.assertEqual(_read_image_size(source), (640, 480))
+
+    def test_can_read_png_size(self):
+        source = save_image(generate_image(size=(640, 480)), format='PNG')
+
+        self.assertEqual(_read_image_size(source), (640, 480))
+
+    def test_can_read_jpeg_with_exif_orientation_size(self):
+        # the stored size is returned, as Pillow does
+        exif = Image.Exif()
+        exif[0x0112] = 6 # rotated 90 degrees clockwise
+        source = save_image(generate_image(size=(640, 480)), format='JPEG',
+            exif=exif.tobytes())
+
+        self.assertEqual(_read_image_size(source), (640, 480))
+
+    def test_returns_none_for_truncated_jpeg(self):
+        data = save_image(generate_image(size=(640, 480)), format='JPEG',
+            exif=Image.Exif().tobytes()).getvalue()
+        source = io.BytesIO(data[:data.index(b'\xff\xc0')])
+
+        self.assertIsNone(_read_image_size(source))
+
+    def test_returns_none_for_unknown_format(self):
+        source = save_image(generate_image(size=(640, 480)), format='BMP')
+
+        self.assertIsNone(_read_image_size(source))
+
+    def test_zip_reader_falls_back_to_pillow(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = osp.join(tmp_dir, 'images.zip')
+            with zipfile.ZipFile(path, 'w') as archive:
+                archive.writestr('1.bmp', save_image(
+                    generate_image(size=(640, 480)), format='BMP').getvalue())
+                archive.writestr('2.jpg', save_image(
+                    generate_image(size=(320, 240)), format='JPEG').getvalue())
+
+            reader = ZipReader([path])
+
+            self.assertEqual(reader.get_image_size(0), (640, 480))
+            self.assertEqual(reader.get_image_size(1), (320, 240))
+
+
+class GuessTypeTest(TestCase):
+    def test_matches_mimetypes(self):
+        for path in ('dir/archive.tar.gz', 'ARCHIVE.TAR.GZ', 'archive.tar.bz2',
+                'archive.tgz', 'file.gz', 'video.MP4', 'IMAGE.JPG',
+                'my.photo.png', 'file.unknownext', 'noext', '.hidden'):
+            with self.subTest(path=path):
+                self.assertEqual(_guess_type(path), mimetypes.guess_type(path))
+
+    def test_can_detect_media_types(self):
+        for path, media_type in (
+                ('dir/archive.tar.gz', 'archive'),
+                ('archive.tar.bz2', 'archive'),
+                ('video.MP4', 'video'),
+                ('IMAGE.JPG', 'image'),
+                ('image.jpg', 'image'),
+                ('document.PDF', 'pdf'),
+                ('images.zip', 'zip'),
+                ('file.unknownext', 'unknown'),
+                ('noext', 'unknown')):
+            with self.subTest(path=path):
+                self.assertEqual(get_mime(path), media_type)
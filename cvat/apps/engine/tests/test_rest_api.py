@@ -3,7 +3,9 @@
 # SPDX-License-Identifier: MIT
 
 
+import hashlib
 import io
+import json
 import os
 import os.path as osp
 import random
@@ -11,27 +13,35 @@ import shutil
 import tempfile
 import xml.etree.ElementTree as ET
 import zipfile
-from collections import defaultdict
+from collections import Counter, defaultdict
 from enum import Enum
+from functools import wraps
 from glob import glob
 from io import BytesIO
 from unittest import mock
 
 import av
 import numpy as np
-from pdf2image import convert_from_bytes
+import PIL
 from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.http import HttpResponse
+from django.urls import resolve
 from PIL import Image
 from pycocotools import coco as coco_loader
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import (APIRequestFactory, APITestCase,
+    force_authenticate)
 
 from cvat.apps.engine.models import (AttributeType, Data, Job, Project,
     Segment, StatusChoice, Task, Label, StorageMethodChoice, StorageChoice)
 from cvat.apps.engine.prepare import prepare_meta, prepare_meta_for_upload
 
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
 def create_db_users(cls):
     (group_admin, _) = Group.objects.get_or_create(name="admin")
     (group_user, _) = Group.objects.get_or_create(name="user")
@@ -40,17 +50,22 @@ def create_db_users(cls):
 
     user_admin = User.objects.create_superuser(username="admin", email="",
         password="admin")
-    user_admin.groups.add(group_admin)
     user_owner = User.objects.create_user(username="user1", password="user1")
-    user_owner.groups.add(group_user)
     user_assignee = User.objects.create_user(username="user2", password="user2")
-    user_assignee.groups.add(group_annotator)
     user_annotator = User.objects.create_user(username="user3", password="user3")
-    user_annotator.groups.add(group_annotator)
     user_observer = User.objects.create_user(username="user4", password="user4")
-    user_observer.groups.add(group_observer)
     user_dummy = User.objects.create_user(username="user5", password="user5")
-    user_dummy.groups.add(group_user)
+    # superusers can be added to the admin group already by a post_save signal
+    User.groups.through.objects.bulk_create([
+        User.groups.through(user=user, group=group) for user, group in (
+            (user_admin, group_admin),
+            (user_owner, group_user),
+            (user_assignee, group_annotator),
+            (user_annotator, group_annotator),
+            (user_observer, group_observer),
+            (user_dummy, group_user),
+        )
+    ], ignore_conflicts=True)
 
     cls.admin = user_admin
     cls.owner = cls.user1 = user_owner
@@ -61,93 +76,82 @@ def create_db_users(cls):
 
 def create_db_task(data):
     data_settings = {
-        "size": data.pop("size"),
-        "image_quality": data.pop("image_quality"),
+        "size": data["size"],
+        "image_quality": data["image_quality"],
     }
+    data = {k: v for k, v in data.items() if k not in data_settings}
 
+    # Ids are reused after test transactions are rolled back,
+    # so the directories can be left by a previous test
     db_data = Data.objects.create(**data_settings)
     shutil.rmtree(db_data.get_data_dirname(), ignore_errors=True)
-    os.makedirs(db_data.get_data_dirname())
     os.makedirs(db_data.get_upload_dirname())
 
     db_task = Task.objects.create(**data)
     shutil.rmtree(db_task.get_task_dirname(), ignore_errors=True)
-    os.makedirs(db_task.get_task_dirname())
     os.makedirs(db_task.get_task_logs_dirname())
     os.makedirs(db_task.get_task_artifacts_dirname())
     db_task.data = db_data
     db_task.save()
 
-    for x in range(0, db_task.data.size, db_task.segment_size):
-        start_frame = x
-        stop_frame = min(x + db_task.segment_size - 1, db_task.data.size - 1)
-
-        db_segment = Segment()
-        db_segment.task = db_task
-        db_segment.start_frame = start_frame
-        db_segment.stop_frame = stop_frame
-        db_segment.save()
-
-        db_job = Job()
-        db_job.segment = db_segment
-        db_job.save()
+    Segment.objects.bulk_create([
+        Segment(task=db_task, start_frame=x,
+            stop_frame=min(x + db_task.segment_size - 1, db_task.data.size - 1))
+        for x in range(0, db_task.data.size, db_task.segment_size)
+    ])
+    # bulk_create() doesn't set primary keys on SQLite, so segments are read back
+    Job.objects.bulk_create([
+        Job(segment=db_segment)
+        for db_segment in Segment.objects.filter(task=db_task).order_by('id')
+    ])
 
     return db_task
 
-def create_dummy_db_tasks(obj, project=None):
-    tasks = []
-
-    data = {
+# Users are referenced by the names of the attributes set in create_db_users()
+DUMMY_DB_TASKS = (
+    {
         "name": "my task #1",
-        "owner": obj.owner,
-        "assignee": obj.assignee,
-        "overlap": 0,
+        "owner": "owner",
+        "assignee": "assignee",
         "segment_size": 100,
         "image_quality": 75,
         "size": 100,
-        "project": project
-    }
-    db_task = create_db_task(data)
-    tasks.append(db_task)
-
-    data = {
+    },
+    {
         "name": "my multijob task",
-        "owner": obj.user,
-        "overlap": 0,
+        "owner": "user",
         "segment_size": 100,
         "image_quality": 50,
         "size": 200,
-        "project": project
-    }
-    db_task = create_db_task(data)
-    tasks.append(db_task)
-
-    data = {
+    },
+    {
         "name": "my task #2",
-        "owner": obj.owner,
-        "assignee": obj.assignee,
-        "overlap": 0,
+        "owner": "owner",
+        "assignee": "assignee",
         "segment_size": 100,
         "image_quality": 75,
         "size": 100,
-        "project": project
-    }
-    db_task = create_db_task(data)
-    tasks.append(db_task)
-
-    data = {
+    },
+    {
         "name": "super task",
-        "owner": obj.admin,
-        "overlap": 0,
+        "owner": "admin",
         "segment_size": 50,
         "image_quality": 95,
         "size": 50,
-        "project": project
-    }
-    db_task = create_db_task(data)
-    tasks.append(db_task)
+    },
+)
 
-    return tasks
+def create_dummy_db_tasks(obj, project=None):
+    return [
+        create_db_task({
+            **spec,
+            "owner": getattr(obj, spec["owner"]),
+            "assignee": getattr(obj, spec["assignee"]) if "assignee" in spec else None,
+            "overlap": 0,
+            "project": project,
+        })
+        for spec in DUMMY_DB_TASKS
+    ]
 
 def create_dummy_db_projects(obj):
     projects = []
@@ -201,32 +205,49 @@ class ForceLogin:
         self.user = user
         self.client = client
 
+    # force_authenticate() only sets the request user for DRF views,
+    # unlike force_login() it doesn't create and flush a session in the DB.
     def __enter__(self):
-        if self.user:
-            self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.client.force_authenticate(user=self.user)
 
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        if self.user:
-            self.client.logout()
-
+        # force_authenticate(user=None) would also call logout(), which flushes
+        # the session, so the forced user is reset on the handler directly
+        self.client.handler._force_user = None
+        self.client.handler._force_token = None
+
+def get_api_view(path, user):
+    # Calls the view resolved for the path directly, without the middleware.
+    # Requests without a user are better sent through APIClient to test
+    # the whole stack.
+    request = APIRequestFactory().get(path)
+    force_authenticate(request, user=user)
+    # NamespaceVersioning takes the API version from the resolver match
+    request.resolver_match = resolve(request.path_info)
+    response = request.resolver_match.func(request,
+        *request.resolver_match.args, **request.resolver_match.kwargs)
+    response.render()
+
+    return response
 
 class JobGetAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
         cls.task = create_dummy_db_tasks(cls)[0]
-        cls.job = Job.objects.filter(segment__task_id=cls.task.id).first()
+        cls.job = Job.objects.select_related('segment').filter(segment__task_id=cls.task.id).first()
         cls.job.assignee = cls.annotator
         cls.job.save()
 
     def _run_api_v1_jobs_id(self, jid, user):
+        path = '/api/v1/jobs/{}'.format(jid)
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/jobs/{}'.format(jid))
+            response = self.client.get(path)
 
         return response
 
@@ -237,54 +258,34 @@ class JobGetAPITestCase(APITestCase):
         self.assertEqual(response.data["start_frame"], self.job.segment.start_frame)
         self.assertEqual(response.data["stop_frame"], self.job.segment.stop_frame)
 
-    def test_api_v1_jobs_id_admin(self):
-        response = self._run_api_v1_jobs_id(self.job.id, self.admin)
-        self._check_request(response)
-        response = self._run_api_v1_jobs_id(self.job.id + 10, self.admin)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-
-    def test_api_v1_jobs_id_owner(self):
-        response = self._run_api_v1_jobs_id(self.job.id, self.owner)
-        self._check_request(response)
-        response = self._run_api_v1_jobs_id(self.job.id + 10, self.owner)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-
-    def test_api_v1_jobs_id_annotator(self):
-        response = self._run_api_v1_jobs_id(self.job.id, self.annotator)
-        self._check_request(response)
-        response = self._run_api_v1_jobs_id(self.job.id + 10, self.annotator)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-
-    def test_api_v1_jobs_id_observer(self):
-        response = self._run_api_v1_jobs_id(self.job.id, self.observer)
-        self._check_request(response)
-        response = self._run_api_v1_jobs_id(self.job.id + 10, self.observer)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-
-    def test_api_v1_jobs_id_user(self):
-        response = self._run_api_v1_jobs_id(self.job.id, self.user)
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-        response = self._run_api_v1_jobs_id(self.job.id + 10, self.user)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
-
-    def test_api_v1_jobs_id_no_auth(self):
-        response = self._run_api_v1_jobs_id(self.job.id, None)
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
-        response = self._run_api_v1_jobs_id(self.job.id + 10, None)
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    def test_api_v1_jobs_id(self):
+        for user, job_status, missing_job_status in (
+            ("admin", status.HTTP_200_OK, status.HTTP_404_NOT_FOUND),
+            ("owner", status.HTTP_200_OK, status.HTTP_404_NOT_FOUND),
+            ("annotator", status.HTTP_200_OK, status.HTTP_404_NOT_FOUND),
+            ("observer", status.HTTP_200_OK, status.HTTP_404_NOT_FOUND),
+            ("user", status.HTTP_403_FORBIDDEN, status.HTTP_404_NOT_FOUND),
+            (None, status.HTTP_401_UNAUTHORIZED, status.HTTP_401_UNAUTHORIZED),
+        ):
+            with self.subTest(user=user):
+                db_user = getattr(self, user) if user else None
+                response = self._run_api_v1_jobs_id(self.job.id, db_user)
+                if job_status == status.HTTP_200_OK:
+                    self._check_request(response)
+                else:
+                    self.assertEqual(response.status_code, job_status)
+                response = self._run_api_v1_jobs_id(self.job.id + 10, db_user)
+                self.assertEqual(response.status_code, missing_job_status)
 
 
 class JobUpdateAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-        self.task = create_dummy_db_tasks(self)[0]
-        self.job = Job.objects.filter(segment__task_id=self.task.id).first()
-        self.job.assignee = self.annotator
-        self.job.save()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
+        cls.task = create_dummy_db_tasks(cls)[0]
+        cls.job = Job.objects.select_related('segment').filter(segment__task_id=cls.task.id).first()
+        cls.job.assignee = cls.annotator
+        cls.job.save()
 
     def _run_api_v1_jobs_id(self, jid, user, data):
         with ForceLogin(user, self.client):
@@ -361,14 +362,11 @@ class JobPartialUpdateAPITestCase(JobUpdateAPITestCase):
         self._check_request(response, data)
 
 class JobReview(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
         cls.task = create_dummy_db_tasks(cls)[0]
-        cls.job = Job.objects.filter(segment__task_id=cls.task.id).first()
+        cls.job = Job.objects.select_related('segment').filter(segment__task_id=cls.task.id).first()
         cls.reviewer = cls.annotator
         cls.job.reviewer = cls.reviewer
         cls.job.assignee = cls.assignee
@@ -409,13 +407,13 @@ class JobReview(APITestCase):
             "reviewer_id": cls.reviewer.id
         }
 
-        cls.create_comment_data = [{
+        cls.create_comment_data = ({
             "message": "This is testing message"
         }, {
             "message": "This is testing message 2"
         }, {
             "message": "This is testing message 3"
-        }]
+        })
 
     def _post_request(self, path, user, data):
         with ForceLogin(user, self.client):
@@ -443,15 +441,15 @@ class JobReview(APITestCase):
 
     def _fetch_job_from_db(self):
         self.job = Job.objects.prefetch_related(
-            'review_set',
-            'review_set__issue_set',
-            'review_set__issue_set__comment_set').filter(segment__task_id=self.task.id).first()
+            'review_set__issue_set__comment_set',
+            'issue_set__comment_set',
+        ).select_related('segment__task').filter(segment__task_id=self.task.id).first()
 
     def _set_annotation_status(self):
-        self._patch_request('/api/v1/jobs/{}'.format(self.job.id), self.admin, {'status': 'annotation'})
+        Job.objects.filter(pk=self.job.id).update(status=StatusChoice.ANNOTATION)
 
     def _set_validation_status(self):
-        self._patch_request('/api/v1/jobs/{}'.format(self.job.id), self.admin, {'status': 'validation'})
+        Job.objects.filter(pk=self.job.id).update(status=StatusChoice.VALIDATION)
 
     def test_api_v1_job_annotation_review(self):
         self._set_annotation_status()
@@ -491,12 +489,8 @@ class JobReview(APITestCase):
         response = self._post_request('/api/v1/reviews', self.reviewer, self.reject_review_data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         issue_id = response.data['issue_set'][0]['id']
-        comments = self.create_comment_data[:]
-        for comment in comments:
-            comment.update({
-                'issue': issue_id
-            })
-            response = self._post_request('/api/v1/comments', self.assignee, comment)
+        for comment in self.create_comment_data:
+            response = self._post_request('/api/v1/comments', self.assignee, {**comment, 'issue': issue_id})
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         response = self._get_request('/api/v1/issues/{}/comments'.format(issue_id), self.reviewer)
         self.assertIsInstance(response.data, cls = list)
@@ -509,15 +503,11 @@ class JobReview(APITestCase):
         response = self._post_request('/api/v1/reviews', self.reviewer, self.reject_review_data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         issue_id = response.data['issue_set'][0]['id']
-        comments = self.create_comment_data[:]
-        for comment in comments:
-            comment.update({
-                'issue': issue_id
-            })
-            response = self._post_request('/api/v1/comments', self.assignee, comment)
+        for comment in self.create_comment_data:
+            response = self._post_request('/api/v1/comments', self.assignee, {**comment, 'issue': issue_id})
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         response = self._get_request('/api/v1/issues/{}/comments'.format(issue_id), self.reviewer)
-        last_comment = max(response.data, key=lambda comment: comment['id'])
+        last_comment = response.data[-1]
         last_comment.update({
             'message': 'fixed message 3'
         })
@@ -531,7 +521,7 @@ class JobReview(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], last_comment['message'])
         response = self._get_request('/api/v1/issues/{}/comments'.format(issue_id), self.reviewer)
-        updated_last_comment = max(response.data, key=lambda comment: comment['id'])
+        updated_last_comment = response.data[-1]
         self.assertEqual(updated_last_comment['message'], last_comment['message'])
         self.job.review_set.all().delete()
         self.job.issue_set.all().delete()
@@ -541,21 +531,22 @@ class JobReview(APITestCase):
         response = self._post_request('/api/v1/reviews', self.reviewer, self.reject_review_data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         issue_id = response.data['issue_set'][0]['id']
-        comments = self.create_comment_data[:]
-        for comment in comments:
-            comment.update({
-                'issue': issue_id
-            })
-            response = self._post_request('/api/v1/comments', self.assignee, comment)
+        for comment in self.create_comment_data:
+            response = self._post_request('/api/v1/comments', self.assignee, {**comment, 'issue': issue_id})
             self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         response = self._get_request('/api/v1/issues/{}/comments'.format(issue_id), self.reviewer)
-        last_comment = max(response.data, key=lambda comment: comment['id'])
+        last_comment = response.data[-1]
         response = self._delete_request('/api/v1/comments/{}'.format(last_comment['id']), self.reviewer)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         response = self._delete_request('/api/v1/comments/{}'.format(last_comment['id']), self.assignee)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self._fetch_job_from_db()
-        ids = list(map(lambda comment: comment.id, self.job.issue_set.first().comment_set.all()))
+        # the job with its segment and task, then the prefetched reviews,
+        # their issues and comments, the job issues and their comments
+        with self.assertNumQueries(6):
+            self._fetch_job_from_db()
+            list(self.job.review_set.all()[0].issue_set.all()[0].comment_set.all())
+            # first() would ignore the prefetched issues and query them again
+            ids = list(map(lambda comment: comment.id, self.job.issue_set.all()[0].comment_set.all()))
         self.assertNotIn(last_comment['id'], ids)
         self.job.review_set.all().delete()
         self.job.issue_set.all().delete()
@@ -582,14 +573,14 @@ class JobReview(APITestCase):
         self.assertEqual(response.data[0]['resolver']['id'], self.reviewer.id)
 
 class ServerAboutAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
 
     def _run_api_v1_server_about(self, user):
+        if user:
+            return get_api_view('/api/v1/server/about', user)
+
         with ForceLogin(user, self.client):
             response = self.client.get('/api/v1/server/about')
 
@@ -614,9 +605,6 @@ class ServerAboutAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 class ServerExceptionAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -658,9 +646,6 @@ class ServerExceptionAPITestCase(APITestCase):
 
 
 class ServerLogsAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -706,9 +691,9 @@ class ServerLogsAPITestCase(APITestCase):
 
 
 class UserAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-        create_db_users(self)
+    @classmethod
+    def setUpTestData(cls):
+        create_db_users(cls)
 
     def _check_response(self, user, response, is_full=True):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -730,6 +715,9 @@ class UserAPITestCase(APITestCase):
 
 class UserListAPITestCase(UserAPITestCase):
     def _run_api_v1_users(self, user):
+        if user:
+            return get_api_view('/api/v1/users', user)
+
         with ForceLogin(user, self.client):
             response = self.client.get('/api/v1/users')
 
@@ -763,8 +751,12 @@ class UserListAPITestCase(UserAPITestCase):
 
 class UserSelfAPITestCase(UserAPITestCase):
     def _run_api_v1_users_self(self, user):
+        path = '/api/v1/users/self'
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/users/self')
+            response = self.client.get(path)
 
         return response
 
@@ -790,8 +782,12 @@ class UserSelfAPITestCase(UserAPITestCase):
 
 class UserGetAPITestCase(UserAPITestCase):
     def _run_api_v1_users_id(self, user, user_id):
+        path = '/api/v1/users/{}'.format(user_id)
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/users/{}'.format(user_id))
+            response = self.client.get(path)
 
         return response
 
@@ -838,10 +834,13 @@ class UserPartialUpdateAPITestCase(UserAPITestCase):
         return response
 
     def _check_response_with_data(self, user, response, data, is_full):
-        # refresh information about the user from DB
-        user = User.objects.get(id=user.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
         for k,v in data.items():
             self.assertEqual(response.data[k], v)
+        # refresh information about the user from DB, only the fields
+        # compared by _check_data are needed
+        user = User.objects.only('id', 'username', 'first_name',
+            'last_name').get(id=user.id)
         self._check_response(user, response, is_full)
 
     def test_api_v1_users_id_admin_partial(self):
@@ -916,82 +915,95 @@ class UserDeleteAPITestCase(UserAPITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 class ProjectListAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
         cls.projects = create_dummy_db_projects(cls)
 
     def _run_api_v1_projects(self, user, params=""):
+        path = '/api/v1/projects{}'.format(params)
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/projects{}'.format(params))
+            response = self.client.get(path)
 
         return response
 
     def test_api_v1_projects_admin(self):
-        response = self._run_api_v1_projects(self.admin)
+        # rules.is_group_member() caches the group names on the user object in
+        # the first request, so the measured request doesn't depend on the order
+        # of the tests that share self.admin
+        self._run_api_v1_projects(self.admin)
+        # Only the queries of the view for the fixture of create_dummy_db_projects(),
+        # get_api_view() skips the middleware. The project serializer still loads
+        # the tasks and their labels, segments, jobs, data and users one by one,
+        # a new query here is a regression.
+        with self.assertNumQueries(127):
+            response = self._run_api_v1_projects(self.admin)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertListEqual(
-            sorted([project.name for project in self.projects]),
-            sorted([res["name"] for res in response.data["results"]]))
+        self.assertEqual(
+            Counter(project.name for project in self.projects),
+            Counter(res["name"] for res in response.data["results"]))
 
     def test_api_v1_projects_user(self):
         response = self._run_api_v1_projects(self.user)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertListEqual(
-            sorted([project.name for project in self.projects
-                if 'my empty project' != project.name]),
-            sorted([res["name"] for res in response.data["results"]]))
+        self.assertEqual(
+            Counter(project.name for project in self.projects
+                if 'my empty project' != project.name),
+            Counter(res["name"] for res in response.data["results"]))
 
     def test_api_v1_projects_observer(self):
         response = self._run_api_v1_projects(self.observer)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertListEqual(
-            sorted([project.name for project in self.projects]),
-            sorted([res["name"] for res in response.data["results"]]))
+        self.assertEqual(
+            Counter(project.name for project in self.projects),
+            Counter(res["name"] for res in response.data["results"]))
 
     def test_api_v1_projects_no_auth(self):
         response = self._run_api_v1_projects(None)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 class ProjectGetAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
         cls.projects = create_dummy_db_projects(cls)
 
     def _run_api_v1_projects_id(self, pid, user):
+        path = '/api/v1/projects/{}'.format(pid)
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/projects/{}'.format(pid))
+            response = self.client.get(path)
 
         return response
 
     def _check_response(self, response, db_project):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data["name"], db_project.name)
+        response_data = response.data
+        self.assertEqual(response_data["name"], db_project.name)
         owner = db_project.owner.id if db_project.owner else None
-        response_owner = response.data["owner"]["id"] if response.data["owner"] else None
+        response_owner = (response_data["owner"] or {}).get("id")
         self.assertEqual(response_owner, owner)
         assignee = db_project.assignee.id if db_project.assignee else None
-        response_assignee = response.data["assignee"]["id"] if response.data["assignee"] else None
+        response_assignee = (response_data["assignee"] or {}).get("id")
         self.assertEqual(response_assignee, assignee)
-        self.assertEqual(response.data["status"], db_project.status)
-        self.assertEqual(response.data["bug_tracker"], db_project.bug_tracker)
+        self.assertEqual(response_data["status"], db_project.status)
+        self.assertEqual(response_data["bug_tracker"], db_project.bug_tracker)
 
     def _check_api_v1_projects_id(self, user):
         for db_project in self.projects:
-            response = self._run_api_v1_projects_id(db_project.id, user)
-            if user and user.has_perm("engine.project.access", db_project):
-                self._check_response(response, db_project)
-            elif user:
-                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-            else:
-                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            with self.subTest(project=db_project.name):
+                response = self._run_api_v1_projects_id(db_project.id, user)
+                if user and user.has_perm("engine.project.access", db_project):
+                    self._check_response(response, db_project)
+                elif user:
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_projects_id_admin(self):
         self._check_api_v1_projects_id(self.admin)
@@ -1006,9 +1018,6 @@ class ProjectGetAPITestCase(APITestCase):
         self._check_api_v1_projects_id(None)
 
 class ProjectDeleteAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -1022,13 +1031,14 @@ class ProjectDeleteAPITestCase(APITestCase):
 
     def _check_api_v1_projects_id(self, user):
         for db_project in self.projects:
-            response = self._run_api_v1_projects_id(db_project.id, user)
-            if user and user.has_perm("engine.project.delete", db_project):
-                self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-            elif user:
-                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-            else:
-                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            with self.subTest(project=db_project.name):
+                response = self._run_api_v1_projects_id(db_project.id, user)
+                if user and user.has_perm("engine.project.delete", db_project):
+                    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+                elif user:
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_projects_id_admin(self):
         self._check_api_v1_projects_id(self.admin)
@@ -1043,9 +1053,6 @@ class ProjectDeleteAPITestCase(APITestCase):
         self._check_api_v1_projects_id(None)
 
 class ProjectCreateAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -1079,33 +1086,29 @@ class ProjectCreateAPITestCase(APITestCase):
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_projects_admin(self):
-        data = {
+        projects = ({
             "name": "new name for the project",
             "bug_tracker": "http://example.com"
-        }
-        self._check_api_v1_projects(self.admin, data)
-
-        data = {
+        }, {
             "owner_id": self.owner.id,
             "assignee_id": self.assignee.id,
             "name": "new name for the project"
-        }
-        self._check_api_v1_projects(self.admin, data)
-
-        data = {
+        }, {
             "owner_id": self.admin.id,
             "name": "2"
-        }
-        self._check_api_v1_projects(self.admin, data)
-
-        data = {
+        }, {
             "name": "Project with labels",
             "labels": [{
                 "name": "car",
             }]
-        }
-        self._check_api_v1_projects(self.admin, data)
+        })
 
+        # admin can always create projects, so the responses are checked
+        # directly and the user is set only once for all requests
+        with ForceLogin(self.admin, self.client):
+            for data in projects:
+                response = self.client.post('/api/v1/projects', data=data, format="json")
+                self._check_response(response, self.admin, data)
 
     def test_api_v1_projects_user(self):
         data = {
@@ -1138,9 +1141,6 @@ class ProjectCreateAPITestCase(APITestCase):
         self._check_api_v1_projects(None, data)
 
 class ProjectPartialUpdateAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -1155,26 +1155,28 @@ class ProjectPartialUpdateAPITestCase(APITestCase):
 
     def _check_response(self, response, db_project, data):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = response.data
         name = data.get("name", data.get("name", db_project.name))
-        self.assertEqual(response.data["name"], name)
-        response_owner = response.data["owner"]["id"] if response.data["owner"] else None
+        self.assertEqual(response_data["name"], name)
+        response_owner = (response_data["owner"] or {}).get("id")
         db_owner = db_project.owner.id if db_project.owner else None
         self.assertEqual(response_owner, data.get("owner_id", db_owner))
-        response_assignee = response.data["assignee"]["id"] if response.data["assignee"] else None
+        response_assignee = (response_data["assignee"] or {}).get("id")
         db_assignee = db_project.assignee.id if db_project.assignee else None
         self.assertEqual(response_assignee, data.get("assignee_id", db_assignee))
-        self.assertEqual(response.data["status"], data.get("status", db_project.status))
-        self.assertEqual(response.data["bug_tracker"], data.get("bug_tracker", db_project.bug_tracker))
+        self.assertEqual(response_data["status"], data.get("status", db_project.status))
+        self.assertEqual(response_data["bug_tracker"], data.get("bug_tracker", db_project.bug_tracker))
 
     def _check_api_v1_projects_id(self, user, data):
         for db_project in self.projects:
-            response = self._run_api_v1_projects_id(db_project.id, user, data)
-            if user and user.has_perm("engine.project.change", db_project):
-                self._check_response(response, db_project, data)
-            elif user:
-                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-            else:
-                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            with self.subTest(project=db_project.name):
+                response = self._run_api_v1_projects_id(db_project.id, user, data)
+                if user and user.has_perm("engine.project.change", db_project):
+                    self._check_response(response, db_project, data)
+                elif user:
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_projects_id_admin(self):
         data = {
@@ -1204,9 +1206,6 @@ class ProjectPartialUpdateAPITestCase(APITestCase):
         self._check_api_v1_projects_id(None, data)
 
 class ProjectListOfTasksAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -1251,90 +1250,107 @@ class ProjectListOfTasksAPITestCase(APITestCase):
 
 
 class TaskListAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
         cls.tasks = create_dummy_db_tasks(cls)
 
     def _run_api_v1_tasks(self, user, params=""):
+        path = '/api/v1/tasks{}'.format(params)
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/tasks{}'.format(params))
+            response = self.client.get(path)
 
         return response
 
     def test_api_v1_tasks_admin(self):
-        response = self._run_api_v1_tasks(self.admin)
+        # rules.is_group_member() caches the group names on the user object in
+        # the first request, so the measured request doesn't depend on the order
+        # of the tests that share self.admin
+        self._run_api_v1_tasks(self.admin)
+        # Only the queries of the view for the fixture of create_dummy_db_tasks(),
+        # get_api_view() skips the middleware. Labels, segments and jobs are
+        # prefetched for all tasks, the data and users are still loaded per task,
+        # a new query here is a regression.
+        with self.assertNumQueries(15):
+            response = self._run_api_v1_tasks(self.admin)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertListEqual(
-            sorted([task.name for task in self.tasks]),
-            sorted([res["name"] for res in response.data["results"]]))
+        self.assertEqual(
+            Counter(task.name for task in self.tasks),
+            Counter(res["name"] for res in response.data["results"]))
 
     def test_api_v1_tasks_user(self):
         response = self._run_api_v1_tasks(self.user)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertListEqual(
-            sorted([task.name for task in self.tasks
-                if (task.owner == self.user or task.assignee == None)]),
-            sorted([res["name"] for res in response.data["results"]]))
+        self.assertEqual(
+            Counter(task.name for task in self.tasks
+                if (task.owner == self.user or task.assignee == None)),
+            Counter(res["name"] for res in response.data["results"]))
 
     def test_api_v1_tasks_observer(self):
         response = self._run_api_v1_tasks(self.observer)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertListEqual(
-            sorted([task.name for task in self.tasks]),
-            sorted([res["name"] for res in response.data["results"]]))
+        self.assertEqual(
+            Counter(task.name for task in self.tasks),
+            Counter(res["name"] for res in response.data["results"]))
 
     def test_api_v1_tasks_no_auth(self):
         response = self._run_api_v1_tasks(None)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 class TaskGetAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
-        cls.tasks = create_dummy_db_tasks(cls)
+        create_dummy_db_tasks(cls)
+        # the tasks aren't changed by the tests, so their labels can be
+        # loaded once for all of them
+        cls.tasks = list(Task.objects.select_related('owner', 'assignee', 'data')
+            .prefetch_related('label_set').order_by('id'))
 
     def _run_api_v1_tasks_id(self, tid, user):
+        path = '/api/v1/tasks/{}'.format(tid)
+        if user:
+            return get_api_view(path, user)
+
         with ForceLogin(user, self.client):
-            response = self.client.get('/api/v1/tasks/{}'.format(tid))
+            response = self.client.get(path)
 
         return response
 
     def _check_response(self, response, db_task):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data["name"], db_task.name)
-        self.assertEqual(response.data["size"], db_task.data.size)
-        self.assertEqual(response.data["mode"], db_task.mode)
+        response_data = response.data
+        self.assertEqual(response_data["name"], db_task.name)
+        self.assertEqual(response_data["size"], db_task.data.size)
+        self.assertEqual(response_data["mode"], db_task.mode)
         owner = db_task.owner.id if db_task.owner else None
-        response_owner = response.data["owner"]["id"] if response.data["owner"] else None
+        response_owner = (response_data["owner"] or {}).get("id")
         self.assertEqual(response_owner, owner)
         assignee = db_task.assignee.id if db_task.assignee else None
-        response_assignee = response.data["assignee"]["id"] if response.data["assignee"] else None
+        response_assignee = (response_data["assignee"] or {}).get("id")
         self.assertEqual(response_assignee, assignee)
-        self.assertEqual(response.data["overlap"], db_task.overlap)
-        self.assertEqual(response.data["segment_size"], db_task.segment_size)
-        self.assertEqual(response.data["image_quality"], db_task.data.image_quality)
-        self.assertEqual(response.data["status"], db_task.status)
+        self.assertEqual(response_data["overlap"], db_task.overlap)
+        self.assertEqual(response_data["segment_size"], db_task.segment_size)
+        self.assertEqual(response_data["image_quality"], db_task.data.image_quality)
+        self.assertEqual(response_data["status"], db_task.status)
         self.assertListEqual(
             [label.name for label in db_task.label_set.all()],
-            [label["name"] for label in response.data["labels"]]
+            [label["name"] for label in response_data["labels"]]
         )
 
     def _check_api_v1_tasks_id(self, user):
         for db_task in self.tasks:
-            response = self._run_api_v1_tasks_id(db_task.id, user)
-            if user and user.has_perm("engine.task.access", db_task):
-                self._check_response(response, db_task)
-            elif user:
-                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-            else:
-                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            with self.subTest(task=db_task.name):
+                response = self._run_api_v1_tasks_id(db_task.id, user)
+                if user and user.has_perm("engine.task.access", db_task):
+                    self._check_response(response, db_task)
+                elif user:
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_tasks_id_admin(self):
         self._check_api_v1_tasks_id(self.admin)
@@ -1349,9 +1365,6 @@ class TaskGetAPITestCase(APITestCase):
         self._check_api_v1_tasks_id(None)
 
 class TaskDeleteAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -1365,13 +1378,14 @@ class TaskDeleteAPITestCase(APITestCase):
 
     def _check_api_v1_tasks_id(self, user):
         for db_task in self.tasks:
-            response = self._run_api_v1_tasks_id(db_task.id, user)
-            if user and user.has_perm("engine.task.delete", db_task):
-                self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-            elif user:
-                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-            else:
-                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            with self.subTest(task=db_task.name):
+                response = self._run_api_v1_tasks_id(db_task.id, user)
+                if user and user.has_perm("engine.task.delete", db_task):
+                    self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+                elif user:
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_tasks_id_admin(self):
         self._check_api_v1_tasks_id(self.admin)
@@ -1386,20 +1400,18 @@ class TaskDeleteAPITestCase(APITestCase):
         self._check_api_v1_tasks_id(None)
 
     def test_api_v1_tasks_delete_task_data_after_delete_task(self):
-        for task in self.tasks:
-            task_dir = task.get_task_dirname()
-            self.assertTrue(os.path.exists(task_dir))
+        # all task directories are in one parent, list it once
+        # instead of checking each directory
+        tasks_root = os.path.dirname(self.tasks[0].get_task_dirname())
+        task_dirs = {os.path.basename(task.get_task_dirname())
+            for task in self.tasks}
+        self.assertLessEqual(task_dirs, set(os.listdir(tasks_root)))
         self._check_api_v1_tasks_id(self.admin)
-        for task in self.tasks:
-            task_dir = task.get_task_dirname()
-            self.assertFalse(os.path.exists(task_dir))
+        self.assertTrue(task_dirs.isdisjoint(os.listdir(tasks_root)))
 
 
 class TaskUpdateAPITestCase(APITestCase):
 
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -1414,44 +1426,46 @@ class TaskUpdateAPITestCase(APITestCase):
 
     def _check_response(self, response, db_task, data):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = response.data
         name = data.get("name", db_task.name)
-        self.assertEqual(response.data["name"], name)
-        self.assertEqual(response.data["size"], db_task.data.size)
+        self.assertEqual(response_data["name"], name)
+        self.assertEqual(response_data["size"], db_task.data.size)
         mode = data.get("mode", db_task.mode)
-        self.assertEqual(response.data["mode"], mode)
+        self.assertEqual(response_data["mode"], mode)
         owner = db_task.owner.id if db_task.owner else None
         owner = data.get("owner_id", owner)
-        response_owner = response.data["owner"]["id"] if response.data["owner"] else None
+        response_owner = (response_data["owner"] or {}).get("id")
         self.assertEqual(response_owner, owner)
         assignee = db_task.assignee.id if db_task.assignee else None
         assignee = data.get("assignee_id", assignee)
-        response_assignee = response.data["assignee"]["id"] if response.data["assignee"] else None
+        response_assignee = (response_data["assignee"] or {}).get("id")
         self.assertEqual(response_assignee, assignee)
-        self.assertEqual(response.data["overlap"], db_task.overlap)
-        self.assertEqual(response.data["segment_size"], db_task.segment_size)
+        self.assertEqual(response_data["overlap"], db_task.overlap)
+        self.assertEqual(response_data["segment_size"], db_task.segment_size)
         image_quality = data.get("image_quality", db_task.data.image_quality)
-        self.assertEqual(response.data["image_quality"], image_quality)
-        self.assertEqual(response.data["status"], db_task.status)
+        self.assertEqual(response_data["image_quality"], image_quality)
+        self.assertEqual(response_data["status"], db_task.status)
         if data.get("labels"):
             self.assertListEqual(
                 [label["name"] for label in data.get("labels")],
-                [label["name"] for label in response.data["labels"]]
+                [label["name"] for label in response_data["labels"]]
             )
         else:
             self.assertListEqual(
                 [label.name for label in db_task.label_set.all()],
-                [label["name"] for label in response.data["labels"]]
+                [label["name"] for label in response_data["labels"]]
             )
 
     def _check_api_v1_tasks_id(self, user, data):
         for db_task in self.tasks:
-            response = self._run_api_v1_tasks_id(db_task.id, user, data)
-            if user and user.has_perm("engine.task.change", db_task):
-                self._check_response(response, db_task, data)
-            elif user:
-                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
-            else:
-                self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            with self.subTest(task=db_task.name):
+                response = self._run_api_v1_tasks_id(db_task.id, user, data)
+                if user and user.has_perm("engine.task.change", db_task):
+                    self._check_response(response, db_task, data)
+                elif user:
+                    self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+                else:
+                    self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_api_v1_tasks_id_admin(self):
         data = {
@@ -1566,7 +1580,6 @@ class TaskPartialUpdateAPITestCase(TaskUpdateAPITestCase):
 
 class TaskCreateAPITestCase(APITestCase):
     def setUp(self):
-        self.client = APIClient()
         project = {
             "name": "Project for task creation",
             "owner": self.user,
@@ -1680,8 +1693,13 @@ def generate_image_file(filename):
     gen = random.SystemRandom()
     width = gen.randint(100, 800)
     height = gen.randint(100, 800)
-    image = Image.new('RGB', size=(width, height))
-    image.save(f, 'jpeg')
+    if simplejpeg is not None:
+        # same chroma subsampling as the Pillow default for this quality
+        f.write(simplejpeg.encode_jpeg(np.zeros((height, width, 3), dtype=np.uint8),
+            quality=75, colorspace='RGB', colorsubsampling='420'))
+    else:
+        image = Image.new('RGB', size=(width, height))
+        image.save(f, 'jpeg')
     f.name = filename
     f.seek(0)
 
@@ -1697,6 +1715,44 @@ def generate_image_files(*args):
 
     return image_sizes, images
 
+# the generated files depend on the encoder versions as well as on the arguments
+_FIXTURE_LIBRARY_VERSIONS = (av.__version__, PIL.__version__,
+    getattr(simplejpeg, '__version__', None))
+
+def cached_fixture(generate):
+    # Keeps the output of a deterministic file generator for the test run,
+    # the files are removed together with the temporary test directory
+    @wraps(generate)
+    def wrapper(filename, *args, **kwargs):
+        cache_dir = os.path.join(settings.MEDIA_ROOT, 'fixtures')
+        key = hashlib.sha1(repr((generate.__name__, filename, args,
+            sorted(kwargs.items()), _FIXTURE_LIBRARY_VERSIONS)).encode()).hexdigest()
+        path = os.path.join(cache_dir, key)
+        try:
+            with open(path + '.json') as f:
+                sizes = [tuple(size) for size in json.load(f)]
+            with open(path, 'rb') as f:
+                data = BytesIO(f.read())
+        except FileNotFoundError:
+            sizes, data = generate(filename, *args, **kwargs)
+            # the sizes are written last and with a rename, so the files are
+            # complete when found even with parallel test processes
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = '{}.{}'.format(path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(data.getvalue())
+            os.replace(tmp_path, path)
+            with open(tmp_path, 'w') as f:
+                json.dump(sizes, f)
+            os.replace(tmp_path, path + '.json')
+
+        data.name = filename
+        data.seek(0)
+        return sizes, data
+
+    return wrapper
+
+@cached_fixture
 def generate_video_file(filename, width=1920, height=1080, duration=1, fps=25, codec_name='mpeg4'):
     f = BytesIO()
     total_frames = duration * fps
@@ -1708,16 +1764,26 @@ def generate_video_file(filename, width=1920, height=1080, duration=1, fps=25, c
     stream.height = height
     stream.pix_fmt = 'yuv420p'
 
-    for frame_i in range(total_frames):
-        img = np.empty((stream.width, stream.height, 3))
-        img[:, :, 0] = 0.5 + 0.5 * np.sin(2 * np.pi * (0 / 3 + frame_i / total_frames))
-        img[:, :, 1] = 0.5 + 0.5 * np.sin(2 * np.pi * (1 / 3 + frame_i / total_frames))
-        img[:, :, 2] = 0.5 + 0.5 * np.sin(2 * np.pi * (2 / 3 + frame_i / total_frames))
-
-        img = np.round(255 * img).astype(np.uint8)
-        img = np.clip(img, 0, 255)
-
-        frame = av.VideoFrame.from_ndarray(img, format='rgb24')
+    # each frame is filled with one color, the colors of all frames are
+    # computed at once and written straight into yuv420p planes, so the
+    # encoder doesn't have to convert every frame from RGB
+    phases = 2 * np.pi * (np.arange(3) / 3 +
+        np.arange(total_frames)[:, np.newaxis] / total_frames)
+    colors = 0.5 + 0.5 * np.sin(phases)
+    # BT.601 limited range, the same conversion swscale does by default
+    yuv_colors = np.round(np.array([16, 128, 128]) + colors @ np.array([
+        [65.481, -37.797, 112.0],
+        [128.553, -74.203, -93.786],
+        [24.966, 112.0, -18.214],
+    ])).astype(np.uint8)
+    plane_size = width * height
+    img = np.empty(plane_size * 3 // 2, dtype=np.uint8)
+    for y, u, v in yuv_colors:
+        img[:plane_size] = y
+        img[plane_size:plane_size * 5 // 4] = u
+        img[plane_size * 5 // 4:] = v
+        # the frame gets its own copy of the pixels
+        frame = av.VideoFrame.from_ndarray(img.reshape(-1, width), format='yuv420p')
         for packet in stream.encode(frame):
             container.mux(packet)
 
@@ -1732,23 +1798,33 @@ def generate_video_file(filename, width=1920, height=1080, duration=1, fps=25, c
 
     return [(width, height)] * total_frames, f
 
-def generate_zip_archive_file(filename, count):
+def generate_zip_archive_file(filename, count, path=None):
+    # With a path the archive is written straight to that file and the path
+    # is returned instead of an in-memory buffer
     image_sizes = []
-    zip_buf = BytesIO()
-    with zipfile.ZipFile(zip_buf, 'w') as zip_chunk:
+    zip_buf = path or BytesIO()
+    # JPEG files don't compress, they are stored as is
+    with zipfile.ZipFile(zip_buf, 'w', compression=zipfile.ZIP_STORED) as zip_chunk:
         for idx in range(count):
             image_name = "image_{:6d}.jpg".format(idx)
             size, image_buf = generate_image_file(image_name)
             image_sizes.append(size)
-            zip_chunk.writestr(image_name, image_buf.getvalue())
+            zip_chunk.writestr(image_name, image_buf.getbuffer())
+
+    if path:
+        return image_sizes, path
 
     zip_buf.name = filename
     zip_buf.seek(0)
     return image_sizes, zip_buf
 
+def generate_pdf_pages(page_count):
+    # the pages are the same, so they share one image
+    return [Image.fromarray(np.ones((50, 100, 3), dtype=np.uint8))] * page_count
+
+@cached_fixture
 def generate_pdf_file(filename, page_count=1):
-    images = [Image.fromarray(np.ones((50, 100, 3), dtype=np.uint8))
-        for _ in range(page_count)]
+    images = generate_pdf_pages(page_count)
     image_sizes = [img.size for img in images]
 
     file_buf = BytesIO()
@@ -1769,97 +1845,60 @@ class TaskDataAPITestCase(APITestCase):
         def __str__(self):
             return self.value
 
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
 
+    # (filename, generator, generator kwargs) of the files put to SHARE_ROOT
+    _share_files = (
+        ("test_1.jpg", generate_image_file, {}),
+        ("test_2.jpg", generate_image_file, {}),
+        ("test_3.jpg", generate_image_file, {}),
+        (os.path.join("data", "test_3.jpg"), generate_image_file, {}),
+        ("test_video_1.mp4", generate_video_file, {"width": 1280, "height": 720}),
+    )
+    # (link, target) of the same files expected under another name
+    _share_links = (
+        (os.path.join("videos", "test_video_1.mp4"), "test_video_1.mp4"),
+    )
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        filename = "test_1.jpg"
-        path = os.path.join(settings.SHARE_ROOT, filename)
-        img_size, data = generate_image_file(filename)
-        with open(path, "wb") as image:
-            image.write(data.read())
-        cls._image_sizes[filename] = img_size
-
-        filename = "test_2.jpg"
-        path = os.path.join(settings.SHARE_ROOT, filename)
-        img_size, data = generate_image_file(filename)
-        with open(path, "wb") as image:
-            image.write(data.read())
-        cls._image_sizes[filename] = img_size
-
-        filename = "test_3.jpg"
-        path = os.path.join(settings.SHARE_ROOT, filename)
-        img_size, data = generate_image_file(filename)
-        with open(path, "wb") as image:
-            image.write(data.read())
-        cls._image_sizes[filename] = img_size
-
-        filename = os.path.join("data", "test_3.jpg")
-        path = os.path.join(settings.SHARE_ROOT, filename)
-        os.makedirs(os.path.dirname(path))
-        img_size, data = generate_image_file(filename)
-        with open(path, "wb") as image:
-            image.write(data.read())
-        cls._image_sizes[filename] = img_size
-
-        filename = "test_video_1.mp4"
-        path = os.path.join(settings.SHARE_ROOT, filename)
-        img_sizes, data = generate_video_file(filename, width=1280, height=720)
-        with open(path, "wb") as video:
-            video.write(data.read())
-        cls._image_sizes[filename] = img_sizes
+        for filename, generate, kwargs in cls._share_files:
+            path = os.path.join(settings.SHARE_ROOT, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            img_sizes, data = generate(filename, **kwargs)
+            with open(path, "wb") as f:
+                shutil.copyfileobj(data, f)
+            cls._image_sizes[filename] = img_sizes
+
+        for filename, target in cls._share_links:
+            path = os.path.join(settings.SHARE_ROOT, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.link(os.path.join(settings.SHARE_ROOT, target), path)
+            cls._image_sizes[filename] = cls._image_sizes[target]
 
         filename = "test_rotated_90_video.mp4"
         path = os.path.join(os.path.dirname(__file__), 'assets', 'test_rotated_90_video.mp4')
         container = av.open(path, 'r')
-        for frame in container.decode(video=0):
-            # pyav ignores rotation record in metadata when decoding frames
-            img_sizes = [(frame.height, frame.width)] * container.streams.video[0].frames
-            break
+        # the stream header has the frame size, no frame has to be decoded.
+        # pyav ignores rotation record in metadata when decoding frames
+        stream = container.streams.video[0]
+        img_sizes = [(stream.codec_context.height, stream.codec_context.width)] * stream.frames
         container.close()
         cls._image_sizes[filename] = img_sizes
 
-        filename = os.path.join("videos", "test_video_1.mp4")
-        path = os.path.join(settings.SHARE_ROOT, filename)
-        os.makedirs(os.path.dirname(path))
-        img_sizes, data = generate_video_file(filename, width=1280, height=720)
-        with open(path, "wb") as video:
-            video.write(data.read())
-        cls._image_sizes[filename] = img_sizes
-
         filename = os.path.join("test_archive_1.zip")
         path = os.path.join(settings.SHARE_ROOT, filename)
-        img_sizes, data = generate_zip_archive_file(filename, count=5)
-        with open(path, "wb") as zip_archive:
-            zip_archive.write(data.read())
+        img_sizes, _ = generate_zip_archive_file(filename, count=5, path=path)
         cls._image_sizes[filename] = img_sizes
 
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
-        path = os.path.join(settings.SHARE_ROOT, "test_1.jpg")
-        os.remove(path)
-
-        path = os.path.join(settings.SHARE_ROOT, "test_2.jpg")
-        os.remove(path)
-
-        path = os.path.join(settings.SHARE_ROOT, "test_3.jpg")
-        os.remove(path)
-
-        path = os.path.join(settings.SHARE_ROOT, "data", "test_3.jpg")
-        os.remove(path)
-
-        path = os.path.join(settings.SHARE_ROOT, "test_video_1.mp4")
-        os.remove(path)
-
-        path = os.path.join(settings.SHARE_ROOT, "videos", "test_video_1.mp4")
-        os.remove(path)
+        for filename, *_ in cls._share_files + cls._share_links:
+            os.remove(os.path.join(settings.SHARE_ROOT, filename))
 
         path = os.path.join(settings.SHARE_ROOT, "videos", "meta_info.txt")
         os.remove(path)
@@ -1905,15 +1944,33 @@ class TaskDataAPITestCase(APITestCase):
         return self._run_api_v1_task_id_data_get(tid, user, "frame", "original", number)
 
     @staticmethod
-    def _extract_zip_chunk(chunk_buffer):
-        chunk = zipfile.ZipFile(chunk_buffer, mode='r')
-        return [Image.open(BytesIO(chunk.read(f))) for f in sorted(chunk.namelist())]
+    def _read_response(response):
+        if isinstance(response, HttpResponse):
+            return io.BytesIO(response.content)
+        # write the chunks one by one to avoid joining them into another copy
+        buf = io.BytesIO()
+        for chunk in response.streaming_content:
+            buf.write(chunk)
+        buf.seek(0)
+        return buf
 
     @staticmethod
-    def _extract_video_chunk(chunk_buffer):
+    def _read_zip_chunk(chunk_buffer):
+        with zipfile.ZipFile(chunk_buffer, mode='r') as chunk:
+            return [chunk.read(f) for f in sorted(chunk.namelist())]
+
+    @classmethod
+    def _get_zip_chunk_sizes(cls, chunk_buffer):
+        return [Image.open(BytesIO(data)).size for data in cls._read_zip_chunk(chunk_buffer)]
+
+    @staticmethod
+    def _get_video_chunk_sizes(chunk_buffer):
+        # only the sizes are checked, so the frames aren't converted to RGB
         container = av.open(chunk_buffer)
         stream = container.streams.video[0]
-        return [f.to_image() for f in container.decode(stream)]
+        sizes = [(f.width, f.height) for f in container.decode(stream)]
+        container.close()
+        return sizes
 
     def _test_api_v1_tasks_id_data_spec(self, user, spec, data, expected_compressed_type, expected_original_type, image_sizes,
                                         expected_storage_method=StorageMethodChoice.FILE_SYSTEM,
@@ -1953,44 +2010,38 @@ class TaskDataAPITestCase(APITestCase):
         response = self._get_preview(task_id, user)
         self.assertEqual(response.status_code, expected_status_code)
         if expected_status_code == status.HTTP_200_OK:
-            preview = Image.open(io.BytesIO(b"".join(response.streaming_content)))
+            preview = Image.open(self._read_response(response))
             self.assertLessEqual(preview.size, image_sizes[0])
 
         # check compressed chunk
         response = self._get_compressed_chunk(task_id, user, 0)
         self.assertEqual(response.status_code, expected_status_code)
         if expected_status_code == status.HTTP_200_OK:
-            if isinstance(response, HttpResponse):
-                compressed_chunk = io.BytesIO(response.content)
-            else:
-                compressed_chunk = io.BytesIO(b"".join(response.streaming_content))
+            compressed_chunk = self._read_response(response)
             if task["data_compressed_chunk_type"] == self.ChunkType.IMAGESET:
-                images = self._extract_zip_chunk(compressed_chunk)
+                frame_sizes = self._get_zip_chunk_sizes(compressed_chunk)
             else:
-                images = self._extract_video_chunk(compressed_chunk)
+                frame_sizes = self._get_video_chunk_sizes(compressed_chunk)
 
-            self.assertEqual(len(images), min(task["data_chunk_size"], len(image_sizes)))
+            self.assertEqual(len(frame_sizes), min(task["data_chunk_size"], len(image_sizes)))
 
-            for image_idx, image in enumerate(images):
-                self.assertEqual(image.size, image_sizes[image_idx])
+            for image_idx, frame_size in enumerate(frame_sizes):
+                self.assertEqual(frame_size, image_sizes[image_idx])
 
         # check original chunk
         response = self._get_original_chunk(task_id, user, 0)
         self.assertEqual(response.status_code, expected_status_code)
         if expected_status_code == status.HTTP_200_OK:
-            if isinstance(response, HttpResponse):
-                original_chunk = io.BytesIO(response.getvalue())
-            else:
-                original_chunk  = io.BytesIO(b"".join(response.streaming_content))
+            original_chunk = self._read_response(response)
             if task["data_original_chunk_type"] == self.ChunkType.IMAGESET:
-                images = self._extract_zip_chunk(original_chunk)
+                frame_sizes = self._get_zip_chunk_sizes(original_chunk)
             else:
-                images = self._extract_video_chunk(original_chunk)
+                frame_sizes = self._get_video_chunk_sizes(original_chunk)
 
-            for image_idx, image in enumerate(images):
-                self.assertEqual(image.size, image_sizes[image_idx])
+            for image_idx, frame_size in enumerate(frame_sizes):
+                self.assertEqual(frame_size, image_sizes[image_idx])
 
-            self.assertEqual(len(images), min(task["data_chunk_size"], len(image_sizes)))
+            self.assertEqual(len(frame_sizes), min(task["data_chunk_size"], len(image_sizes)))
 
             if task["data_original_chunk_type"] == self.ChunkType.IMAGESET:
                 server_files = [img for key, img in data.items() if key.startswith("server_files")]
@@ -2001,21 +2052,33 @@ class TaskDataAPITestCase(APITestCase):
                 else:
                     source_files = [f for f in sorted(client_files, key=lambda e: e.name)]
 
+                # encoded files where the source has them, decoded images otherwise
                 source_images = []
                 for f in source_files:
                     if zipfile.is_zipfile(f):
-                        source_images.extend(self._extract_zip_chunk(f))
+                        source_images.extend(self._read_zip_chunk(f))
                     elif isinstance(f, io.BytesIO) and \
                             str(getattr(f, 'name', None)).endswith('.pdf'):
-                        source_images.extend(convert_from_bytes(f.getvalue(),
-                            fmt='png'))
+                        # the pages are rendered with the resolution they
+                        # are saved with, so they match the generated images
+                        source_images.extend(generate_pdf_pages(len(image_sizes)))
+                    elif isinstance(f, io.BytesIO):
+                        source_images.append(f.getvalue())
                     else:
-                        source_images.append(Image.open(f))
-
-                for img_idx, image in enumerate(images):
-                    server_image = np.array(image)
-                    source_image = np.array(source_images[img_idx])
-                    self.assertTrue(np.array_equal(source_image, server_image))
+                        with open(f, 'rb') as image_file:
+                            source_images.append(image_file.read())
+
+                server_images = self._read_zip_chunk(original_chunk)
+                for img_idx, server_image in enumerate(server_images):
+                    source_image = source_images[img_idx]
+                    # the original chunk keeps the uploaded files as is,
+                    # so they are decoded only if the bytes differ
+                    if source_image == server_image:
+                        continue
+                    if isinstance(source_image, bytes):
+                        source_image = Image.open(BytesIO(source_image))
+                    server_image = Image.open(BytesIO(server_image))
+                    self.assertTrue(np.array_equal(np.asarray(source_image), np.asarray(server_image)))
 
     def _test_api_v1_tasks_id_data(self, user):
         task_spec = {
@@ -2463,9 +2526,6 @@ def compare_objects(self, obj1, obj2, ignore_keys, fp_tolerance=.001):
             self.assertEqual(obj1, obj2)
 
 class JobAnnotationAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
@@ -4004,9 +4064,6 @@ class TaskAnnotationAPITestCase(JobAnnotationAPITestCase):
         self._run_coco_annotation_upload_test(self.user)
 
 class ServerShareAPITestCase(APITestCase):
-    def setUp(self):
-        self.client = APIClient()
-
     @classmethod
     def setUpTestData(cls):
         create_db_users(cls)
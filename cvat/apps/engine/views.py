@@ -860,7 +860,7 @@ class IssueViewSet(viewsets.GenericViewSet,  mixins.DestroyModelMixin, mixins.Up
     @action(detail=True, methods=['GET'], serializer_class=CommentSerializer)
     def comments(self, request, pk):
         db_issue = self.get_object()
-        queryset = db_issue.comment_set
+        queryset = db_issue.comment_set.order_by('id')
         serializer = CommentSerializer(queryset, context={'request': request}, many=True)
         return Response(serializer.data)
 
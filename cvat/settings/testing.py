@@ -4,7 +4,9 @@
 
 from .development import *
 import tempfile
+import django
 
+# Test data can be kept in memory by running tests with TMPDIR=/dev/shm
 _temp_dir = tempfile.TemporaryDirectory(suffix="cvat")
 
 DATA_ROOT = os.path.join(_temp_dir.name, 'data')
@@ -19,11 +21,15 @@ os.makedirs(MEDIA_DATA_ROOT, exist_ok=True)
 TASKS_ROOT = os.path.join(DATA_ROOT, 'tasks')
 os.makedirs(TASKS_ROOT, exist_ok=True)
 
+PROJECTS_ROOT = os.path.join(DATA_ROOT, 'projects')
+os.makedirs(PROJECTS_ROOT, exist_ok=True)
+
 MODELS_ROOT = os.path.join(DATA_ROOT, 'models')
 os.makedirs(MODELS_ROOT, exist_ok=True)
 
 CACHE_ROOT = os.path.join(DATA_ROOT, 'cache')
 os.makedirs(CACHE_ROOT, exist_ok=True)
+CACHES['default']['LOCATION'] = CACHE_ROOT
 
 # To avoid ERROR django.security.SuspiciousFileOperation:
 # The joined path (...) is located outside of the base path component
@@ -46,8 +52,46 @@ PASSWORD_HASHERS = (
 # testing behavior.
 TEST_RUNNER = "cvat.settings.testing.PatchedDiscoverRunner"
 
-from django.test.runner import DiscoverRunner
+from django.core.exceptions import ImproperlyConfigured
+from django.test import runner as _django_test_runner
+from django.test.runner import DiscoverRunner, ParallelTestSuite, _init_worker
+
+# The per-worker directories below are set up with private parts of the
+# Django 3.1 test runner: the worker initializer is replaced through
+# ParallelTestSuite.init_worker and the worker number is read from
+# django.test.runner._worker_id. Fail right away if they are gone.
+if not hasattr(ParallelTestSuite, 'init_worker') or \
+        not hasattr(_django_test_runner, '_worker_id'):
+    raise ImproperlyConfigured('The parallel test worker setup in {} needs to be '
+        'updated for Django {}'.format(__name__, django.get_version()))
+
+def _init_parallel_worker(counter):
+    _init_worker(counter)
+
+    # Django gives each worker its own copy of the test database, but task and
+    # data ids are the same in all copies, so the directories named after them
+    # have to be separated as well
+    from django.conf import settings
+    worker_dir = os.path.join(_temp_dir.name, 'worker_{}'.format(_django_test_runner._worker_id))
+    settings.DATA_ROOT = os.path.join(worker_dir, 'data')
+    settings.MEDIA_DATA_ROOT = os.path.join(settings.DATA_ROOT, 'data')
+    settings.TASKS_ROOT = os.path.join(settings.DATA_ROOT, 'tasks')
+    settings.PROJECTS_ROOT = os.path.join(settings.DATA_ROOT, 'projects')
+    settings.MODELS_ROOT = os.path.join(settings.DATA_ROOT, 'models')
+    settings.CACHE_ROOT = os.path.join(settings.DATA_ROOT, 'cache')
+    settings.CACHES['default']['LOCATION'] = settings.CACHE_ROOT
+    settings.SHARE_ROOT = os.path.join(worker_dir, 'share')
+    for path in (settings.MEDIA_DATA_ROOT, settings.TASKS_ROOT,
+            settings.PROJECTS_ROOT, settings.MODELS_ROOT, settings.CACHE_ROOT, settings.SHARE_ROOT):
+        os.makedirs(path, exist_ok=True)
+
+class PatchedParallelTestSuite(ParallelTestSuite):
+    init_worker = _init_parallel_worker
+
 class PatchedDiscoverRunner(DiscoverRunner):
+    # Use ./manage.py test --parallel to run test cases in several processes
+    parallel_test_suite = PatchedParallelTestSuite
+
     def __init__(self, *args, **kwargs):
         # Used fakeredis for testing (don't affect production redis)
         from fakeredis import FakeRedis, FakeStrictRedis
@@ -61,4 +105,11 @@ class PatchedDiscoverRunner(DiscoverRunner):
         for config in RQ_QUEUES.values():
             config["ASYNC"] = False
 
-        super().__init__(*args, **kwargs)
\ No newline at end of file
+        super().__init__(*args, **kwargs)
+
+        # An in-memory test database is migrated from scratch on every run.
+        # With ./manage.py test --keepdb it is kept in a file instead and
+        # reused by the next runs. Run without --keepdb after changing models.
+        if self.keepdb:
+            DATABASES['default'].setdefault('TEST', {})['NAME'] = \
+                os.path.join(BASE_DIR, 'test_db.sqlite3')
\ No newline at end of file